@@ -0,0 +1,104 @@
+from dataclasses import dataclass
+from datetime import date
+from functools import lru_cache
+from typing import Final
+
+import numpy as np
+
+# -----------------------------
+# LOOKUP TABLES (built once at import)
+# -----------------------------
+_MATERIAL_ADJ: Final[dict[str, float]] = {
+    "Silk": 1.10, "Satin": 1.07, "Lace": 1.05, "Sequin": 1.12,
+    "Cotton": 1.00, "Polyester": 0.98, "Other": 1.00, "Unknown": 1.00,
+}
+# Indexed directly by the 1-5 condition score (slot 0 unused)
+_CONDITION_ADJ: Final[tuple[float | None, ...]] = (None, 0.75, 0.85, 0.93, 1.00, 1.05)
+_SILHOUETTE_ADJ: Final[dict[str, float]] = {"mini":1.00, "midi":1.05, "gown":1.15, "set":1.02, "jumpsuit":0.95, "Unknown":1.00}
+
+# -----------------------------
+# CALENDAR SLICE (struct of arrays)
+# -----------------------------
+_MONTHS: Final = np.arange(1, 13, dtype=np.int8)
+
+@dataclass(frozen=True, eq=False)
+class CalendarSlice:
+    """One user type's calendar rows as parallel NumPy arrays."""
+    occasions: np.ndarray
+    starts: np.ndarray  # int8 months
+    ends: np.ndarray
+    mults: np.ndarray   # float64
+    season: np.ndarray  # (12, rows) bool; row m-1 is the in-season mask for month m
+
+    @classmethod
+    def from_frame(cls, df):
+        starts = df["start_month"].to_numpy(dtype=np.int8)
+        ends = df["end_month"].to_numpy(dtype=np.int8)
+        return cls(
+            occasions=df["occasion"].to_numpy(dtype=object),
+            starts=starts,
+            ends=ends,
+            mults=df["multiplier"].to_numpy(dtype=np.float64),
+            season=season_mask(_MONTHS[:, None], starts, ends),
+        )
+
+    def in_season(self, month):
+        return self.season[month - 1]
+
+# -----------------------------
+# HELPERS (pricing math)
+# -----------------------------
+@lru_cache(maxsize=256)  # few distinct (days, weekend, pct, pct) combos per session
+def rush_weekend_multiplier(days, weekend, rush_pct, weekend_pct):
+    m = 1.0
+    if days is not None and days <= 4:
+        m *= (1 + rush_pct/100.0)
+    if weekend:
+        m *= (1 + weekend_pct/100.0)
+    return m
+
+def base_rental(original_price, base_pct, material, condition, silhouette,
+                days, weekend, rush_pct, weekend_pct):
+    """Base rental (pre-season) with all per-item adjustments applied."""
+    # Applied one at a time in this order: regrouping the product shifts the last bit,
+    # which flips whole-dollar rounding for prices that land on .5
+    base = original_price * (base_pct/100.0)
+    base *= _MATERIAL_ADJ.get(material, 1.00)
+    base *= _CONDITION_ADJ[int(condition)]
+    base *= _SILHOUETTE_ADJ.get(silhouette, 1.00)
+    base *= rush_weekend_multiplier(days, weekend, rush_pct, weekend_pct)
+    return base
+
+def confidence_score(material, condition, silhouette):
+    """Simple confidence (%) in the suggested price; one scalar per report."""
+    conf = 70
+    if material in ("Silk", "Sequin") and condition >= 4: conf += 5
+    if silhouette == "gown": conf += 5
+    return conf
+
+def season_mask(month, s, e):
+    """In-season flag per row for whole start/end month arrays."""
+    # wraps year end (e.g., Dec–Jan) when start > end
+    return np.where(s <= e, (month >= s) & (month <= e), (month >= s) | (month <= e))
+
+def price_bands(base_price, multipliers):
+    """Suggested/low/high prices per occasion, rounded to whole dollars in one NumPy pass."""
+    # float64 throughout: float32 moves x.5 products (e.g. 55 * 1.10) across the rounding boundary
+    m = np.asarray(multipliers, dtype=np.float64)
+    # Round in place so each band costs one allocation, not a product plus a rounded copy
+    suggested = np.multiply(m, base_price)
+    np.rint(suggested, out=suggested)
+    low = np.multiply(suggested, 0.90)
+    np.rint(low, out=low)
+    high = np.multiply(suggested, 1.10)
+    np.rint(high, out=high)
+    return suggested, low, high
+
+def event_timing(event_date, today):
+    """Days until the event and whether it lands on a weekend, via datetime64[D] arithmetic."""
+    if not isinstance(event_date, date):
+        return None, False
+    ed = np.datetime64(event_date, "D")
+    days = int((ed - np.datetime64(today, "D")).astype(np.int64))
+    # is_busday's default Mon-Fri weekmask: not a business day == Saturday/Sunday
+    return days, not bool(np.is_busday(ed))